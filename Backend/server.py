@@ -1,11 +1,23 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+import hmac
 import json
+import math
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
+import httpx
 import uvicorn
 from dotenv import load_dotenv
 
@@ -17,6 +29,68 @@ ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "")
 
+def available_cpus() -> int:
+    """CPUs this process may actually use, honouring affinity and the container's cgroup quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    
+    # cgroup v2 exposes "<quota> <period>", cgroup v1 splits them across two files
+    quota_files = [("/sys/fs/cgroup/cpu.max", None), ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us")]
+    for quota_path, period_path in quota_files:
+        try:
+            with open(quota_path) as f:
+                values = f.read().split()
+            if period_path:
+                with open(period_path) as f:
+                    values.append(f.read().strip())
+            quota, period = values[0], values[1]
+        except (OSError, IndexError):
+            continue
+        
+        if quota not in ("max", "-1") and int(period) > 0:
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+        break
+    
+    return cpus
+
+# Server tuning (used by the __main__ launcher)
+WORKERS = int(os.getenv("WORKERS", str(available_cpus()) if ENVIRONMENT == "production" else "1"))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "75"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "120"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").lower()
+# Proxies whose X-Forwarded-For is trusted for the client IP (e.g. nginx/traefik addresses, or "*")
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+WARMUP_LLM = os.getenv("WARMUP_LLM", "true").lower() in ("1", "true", "yes")
+# Seconds an idle OpenAI connection stays pooled (the openai default is 5s)
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "300"))
+
+# Per-client rate limiting (requests and LLM tokens, refilled per minute)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "10"))
+RATE_LIMIT_REQUEST_BURST = float(os.getenv("RATE_LIMIT_REQUEST_BURST", str(RATE_LIMIT_REQUESTS_PER_MINUTE)))
+RATE_LIMIT_TOKENS_PER_MINUTE = float(os.getenv("RATE_LIMIT_TOKENS_PER_MINUTE", "60000"))
+RATE_LIMIT_TOKEN_BURST = float(os.getenv("RATE_LIMIT_TOKEN_BURST", str(RATE_LIMIT_TOKENS_PER_MINUTE)))
+# Path to a SQLite file shared by all workers; empty keeps state in memory per worker.
+# Defaults to a shared file whenever more than one worker runs.
+RATE_LIMIT_DB = os.getenv(
+    "RATE_LIMIT_DB",
+    os.path.join(tempfile.gettempdir(), "generative-ui-rate-limits.db") if WORKERS > 1 else ""
+)
+# Comma-separated API keys that get their own bucket; any other caller is limited by IP
+RATE_LIMIT_API_KEYS = {
+    hashlib.sha256(key.strip().encode()).hexdigest()
+    for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()
+}
+# Key that may read every client's usage from /usage?all=true
+RATE_LIMIT_ADMIN_KEY = os.getenv("RATE_LIMIT_ADMIN_KEY", "")
+# Every endpoint that calls the LLM
+RATE_LIMITED_PATHS = {"/generate-app", "/test-llm"}
+# Seconds between sweeps that forget IP clients whose buckets have refilled
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "60"))
+
 # Configure CORS origins based on environment
 if ENVIRONMENT == "production":
     # Production CORS configuration
@@ -43,14 +117,6 @@ else:
         "http://127.0.0.1:3003"
     ]
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allowed_origins,
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-)
 # Pydantic models
 class ComponentInfo(BaseModel):
     name: str
@@ -67,8 +133,17 @@ class AppGenerationResponse(BaseModel):
     success: bool
     message: str
 
+def create_llm_http_clients() -> Dict[str, Any]:
+    """HTTP clients for the LLM that keep idle connections long enough to reuse the warm-up one"""
+    timeout = httpx.Timeout(600, connect=5)
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100, keepalive_expiry=LLM_KEEPALIVE_EXPIRY)
+    return {
+        "http_client": httpx.Client(timeout=timeout, limits=limits),
+        "http_async_client": httpx.AsyncClient(timeout=timeout, limits=limits),
+    }
+
 # Initialize OpenAI LLM
-llm = ChatOpenAI(model="gpt-5-2025-08-07", temperature=0.1)
+llm = ChatOpenAI(model="gpt-5-2025-08-07", temperature=0.1, **create_llm_http_clients())
 
 # Embedded components data - no external file dependency
 EMBEDDED_COMPONENTS = {
@@ -415,6 +490,7 @@ class ReactAppGenerator:
     def __init__(self, llm, component_parser: ShadcnComponentParser):
         self.llm = llm
         self.component_parser = component_parser
+        self.last_usage: Dict[str, int] = {}
     
     def generate_system_prompt(self) -> str:
         components_info = self.component_parser.get_all_components_summary()
@@ -466,7 +542,7 @@ Requirements:
 
 Generate the complete app.jsx code now."""
 
-    def generate_app(self, user_prompt: str) -> tuple[str, List[str]]:
+    async def generate_app(self, user_prompt: str) -> tuple[str, List[str]]:
         """Generate the React app code"""
         try:
             print(f"Creating system and human messages for prompt: {user_prompt}")
@@ -475,7 +551,9 @@ Generate the complete app.jsx code now."""
             human_message = HumanMessage(content=self.generate_user_prompt(user_prompt))
             
             print("Calling LLM...")
-            response = self.llm.invoke([system_message, human_message])
+            response = await self.llm.ainvoke([system_message, human_message])
+            # Record usage first so the tokens are charged even if processing below fails
+            self.last_usage = response.usage_metadata or {}
             app_code = response.content
             
             print(f"LLM response received, length: {len(app_code)}")
@@ -503,6 +581,311 @@ Generate the complete app.jsx code now."""
         
         return used_components
 
+RATE_LIMIT_COUNTERS = ("requests", "rejected", "input_tokens", "output_tokens", "total_tokens")
+
+class InMemoryRateLimitStore:
+    """Keeps per-client rate limit state in this process"""
+    
+    # Calls only hold a lock for microseconds, so they run directly on the event loop
+    executor = None
+    
+    def __init__(self):
+        self._clients: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def update(self, client_id: str, fn):
+        """Atomically apply fn(state) -> (new_state, result) for a client"""
+        with self._lock:
+            new_state, result = fn(self._clients.get(client_id))
+            self._clients[client_id] = new_state
+            return result
+    
+    def get(self, client_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._clients.get(client_id)
+            return dict(state) if state else None
+    
+    def get_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {client_id: dict(state) for client_id, state in self._clients.items()}
+    
+    def prune(self, should_remove) -> int:
+        """Forget every client for which should_remove(client_id, state) is true"""
+        with self._lock:
+            stale = [client_id for client_id, state in self._clients.items() if should_remove(client_id, state)]
+            for client_id in stale:
+                del self._clients[client_id]
+            return len(stale)
+
+class SQLiteRateLimitStore:
+    """Keeps per-client rate limit state in a SQLite file shared by all workers"""
+    
+    FIELDS = ("request_tokens", "llm_tokens", "updated_at") + RATE_LIMIT_COUNTERS
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Calls may wait on another worker's write lock, so they run on their own thread
+        # rather than the shared threadpool, where they could queue behind unrelated work
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit-db")
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "client_id TEXT PRIMARY KEY, request_tokens REAL, llm_tokens REAL, updated_at REAL, "
+            "requests INTEGER, rejected INTEGER, input_tokens INTEGER, output_tokens INTEGER, total_tokens INTEGER)"
+        )
+    
+    def _row_to_state(self, row) -> Dict[str, Any]:
+        return dict(zip(self.FIELDS, row))
+    
+    def update(self, client_id: str, fn):
+        """Atomically apply fn(state) -> (new_state, result) for a client"""
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front so workers can't interleave
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(self.FIELDS)} FROM rate_limits WHERE client_id = ?", (client_id,)
+                ).fetchone()
+                new_state, result = fn(self._row_to_state(row) if row else None)
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO rate_limits (client_id, {', '.join(self.FIELDS)}) "
+                    f"VALUES (?, {', '.join('?' for _ in self.FIELDS)})",
+                    (client_id, *(new_state[field] for field in self.FIELDS))
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def get(self, client_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM rate_limits WHERE client_id = ?", (client_id,)
+            ).fetchone()
+            return self._row_to_state(row) if row else None
+    
+    def get_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT client_id, {', '.join(self.FIELDS)} FROM rate_limits").fetchall()
+            return {row[0]: self._row_to_state(row[1:]) for row in rows}
+    
+    def prune(self, should_remove) -> int:
+        """Forget every client for which should_remove(client_id, state) is true"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(f"SELECT client_id, {', '.join(self.FIELDS)} FROM rate_limits").fetchall()
+                stale = [(row[0],) for row in rows if should_remove(row[0], self._row_to_state(row[1:]))]
+                self._conn.executemany("DELETE FROM rate_limits WHERE client_id = ?", stale)
+                self._conn.execute("COMMIT")
+                return len(stale)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+class TokenBucketRateLimiter:
+    """Per-client token buckets for request rate and LLM token consumption.
+    
+    A per-minute rate of 0 (or less) turns that bucket off. IP clients are
+    forgotten once both buckets have refilled, so the store only grows with
+    recently active callers; API key clients keep their usage counters.
+    """
+    
+    def __init__(self, store, requests_per_minute: float, request_burst: float,
+                 tokens_per_minute: float, token_burst: float, sweep_interval: float = 60):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+        self.limit_requests = requests_per_minute > 0
+        self.request_burst = request_burst
+        self.request_rate = max(0.0, requests_per_minute / 60)
+        self.limit_tokens = tokens_per_minute > 0
+        self.token_burst = token_burst
+        self.token_rate = max(0.0, tokens_per_minute / 60)
+    
+    def _refill(self, state: Optional[Dict[str, Any]], now: float) -> Dict[str, Any]:
+        """Return the client's state with both buckets topped up to now"""
+        if state is None:
+            state = {"request_tokens": self.request_burst, "llm_tokens": self.token_burst, "updated_at": now}
+            state.update({counter: 0 for counter in RATE_LIMIT_COUNTERS})
+            return state
+        
+        elapsed = max(0.0, now - state["updated_at"])
+        state = dict(state)
+        state["request_tokens"] = min(self.request_burst, state["request_tokens"] + elapsed * self.request_rate)
+        state["llm_tokens"] = min(self.token_burst, state["llm_tokens"] + elapsed * self.token_rate)
+        state["updated_at"] = now
+        return state
+    
+    def _is_idle(self, client_id: str, state: Dict[str, Any], now: float) -> bool:
+        """An IP client whose buckets are full again has nothing worth keeping"""
+        if client_id.startswith("key:"):
+            return False
+        state = self._refill(state, now)
+        requests_full = not self.limit_requests or state["request_tokens"] >= self.request_burst
+        tokens_full = not self.limit_tokens or state["llm_tokens"] >= self.token_burst
+        return requests_full and tokens_full
+    
+    def sweep(self) -> int:
+        """Forget idle IP clients, at most once per sweep interval"""
+        now = time.time()
+        if now < self._next_sweep:
+            return 0
+        self._next_sweep = now + self.sweep_interval
+        
+        removed = self.store.prune(lambda client_id, state: self._is_idle(client_id, state, now))
+        if removed:
+            print(f"Rate limiter forgot {removed} idle client(s)")
+        return removed
+    
+    def acquire(self, client_id: str) -> tuple[bool, Dict[str, Any], int]:
+        """Take one request from the client's buckets.
+        
+        Returns (allowed, state, retry_after_seconds). The LLM token bucket only
+        needs to be positive here, the actual usage is charged by record_usage.
+        """
+        def take(state):
+            state = self._refill(state, time.time())
+            retry_after = 0.0
+            if self.limit_requests and state["request_tokens"] < 1:
+                retry_after = (1 - state["request_tokens"]) / self.request_rate
+            if self.limit_tokens and state["llm_tokens"] < 1:
+                retry_after = max(retry_after, (1 - state["llm_tokens"]) / self.token_rate)
+            
+            if retry_after > 0:
+                state["rejected"] += 1
+                return state, (False, state, math.ceil(retry_after))
+            
+            if self.limit_requests:
+                state["request_tokens"] -= 1
+            state["requests"] += 1
+            return state, (True, state, 0)
+        
+        self.sweep()
+        return self.store.update(client_id, take)
+    
+    def record_usage(self, client_id: str, usage: Dict[str, int]) -> Dict[str, Any]:
+        """Charge the LLM tokens reported in the response usage metadata"""
+        def charge(state):
+            state = self._refill(state, time.time())
+            total_tokens = usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+            # The bucket may go negative; the client then waits until it refills
+            if self.limit_tokens:
+                state["llm_tokens"] -= total_tokens
+            state["input_tokens"] += usage.get("input_tokens", 0)
+            state["output_tokens"] += usage.get("output_tokens", 0)
+            state["total_tokens"] += total_tokens
+            return state, state
+        
+        return self.store.update(client_id, charge)
+    
+    def headers(self, state: Dict[str, Any]) -> Dict[str, str]:
+        """Rate limit response headers for the client's current state"""
+        headers = {}
+        
+        if self.limit_requests:
+            request_reset = (self.request_burst - state["request_tokens"]) / self.request_rate
+            headers["X-RateLimit-Limit-Requests"] = str(int(self.request_burst))
+            headers["X-RateLimit-Remaining-Requests"] = str(max(0, int(state["request_tokens"])))
+            headers["X-RateLimit-Reset-Requests"] = str(math.ceil(max(0.0, request_reset)))
+        
+        if self.limit_tokens:
+            token_reset = (self.token_burst - state["llm_tokens"]) / self.token_rate
+            headers["X-RateLimit-Limit-Tokens"] = str(int(self.token_burst))
+            headers["X-RateLimit-Remaining-Tokens"] = str(max(0, int(state["llm_tokens"])))
+            headers["X-RateLimit-Reset-Tokens"] = str(math.ceil(max(0.0, token_reset)))
+        
+        return headers
+    
+    def get_usage(self, client_id: str) -> Dict[str, Any]:
+        """Usage counters and remaining capacity for a client"""
+        state = self._refill(self.store.get(client_id), time.time())
+        return {
+            "client_id": client_id,
+            **{counter: state[counter] for counter in RATE_LIMIT_COUNTERS},
+            "remaining_requests": max(0, int(state["request_tokens"])) if self.limit_requests else None,
+            "remaining_tokens": max(0, int(state["llm_tokens"])) if self.limit_tokens else None,
+        }
+    
+    def get_all_usage(self) -> List[Dict[str, Any]]:
+        """Usage counters for every known client"""
+        return [self.get_usage(client_id) for client_id in self.store.get_all()]
+    
+    async def run(self, fn, *args):
+        """Call a limiter method, off the event loop when the store may block"""
+        if self.store.executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.store.executor, partial(fn, *args))
+
+def get_client_id(request: Request) -> str:
+    """Identify the caller by a configured API key (hashed) or, failing that, by IP address"""
+    api_key = request.headers.get("x-api-key")
+    if not api_key:
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            api_key = authorization[7:].strip()
+    
+    # Unknown keys are ignored so callers can't get a fresh bucket by inventing one
+    if api_key:
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+        if key_hash in RATE_LIMIT_API_KEYS:
+            return "key:" + key_hash[:16]
+    
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+rate_limiter = TokenBucketRateLimiter(
+    SQLiteRateLimitStore(RATE_LIMIT_DB) if RATE_LIMIT_DB else InMemoryRateLimitStore(),
+    requests_per_minute=RATE_LIMIT_REQUESTS_PER_MINUTE,
+    request_burst=RATE_LIMIT_REQUEST_BURST,
+    tokens_per_minute=RATE_LIMIT_TOKENS_PER_MINUTE,
+    token_burst=RATE_LIMIT_TOKEN_BURST,
+    sweep_interval=RATE_LIMIT_SWEEP_INTERVAL,
+)
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    """Enforce per-client request and LLM token limits on the generation endpoints"""
+    if not RATE_LIMIT_ENABLED or request.method == "OPTIONS" or request.url.path not in RATE_LIMITED_PATHS:
+        return await call_next(request)
+    
+    client_id = get_client_id(request)
+    allowed, state, retry_after = await rate_limiter.run(rate_limiter.acquire, client_id)
+    
+    if not allowed:
+        print(f"Rate limit exceeded for {client_id}, retry in {retry_after}s")
+        headers = rate_limiter.headers(state)
+        headers["Retry-After"] = str(retry_after)
+        return JSONResponse(
+            status_code=429,
+            content={"detail": f"Rate limit exceeded, retry in {retry_after} seconds"},
+            headers=headers
+        )
+    
+    response = await call_next(request)
+    
+    # The endpoint leaves the LLM usage metadata on request.state
+    usage = getattr(request.state, "llm_usage", None)
+    if usage:
+        state = await rate_limiter.run(rate_limiter.record_usage, client_id, usage)
+    
+    response.headers.update(rate_limiter.headers(state))
+    return response
+
+# Add CORS middleware last so it wraps every response, including 429s
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=allowed_origins,
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After"] + [
+        f"X-RateLimit-{kind}-{bucket}" for kind in ("Limit", "Remaining", "Reset") for bucket in ("Requests", "Tokens")
+    ],
+)
+
 # LLM will be initialized in startup event
 
 # Global component parser - will be initialized lazily
@@ -540,19 +923,42 @@ def initialize_components():
     if llm is None:
         try:
             # Initialize LLM
-            llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+            llm = ChatOpenAI(model="gpt-4o", temperature=0.1, **create_llm_http_clients())
             print("LLM initialized successfully")
         except Exception as e:
             print(f"Error initializing LLM: {e}")
             raise e
 
+async def warmup_llm_connection():
+    """Open the LLM HTTP connection pool so the first generation skips TLS setup"""
+    if llm is None:
+        return
+    
+    try:
+        start = time.monotonic()
+        # Listing models is free and leaves a keep-alive connection in the async pool generations use
+        await llm.root_async_client.models.list()
+        print(f"LLM connection pool warmed up in {time.monotonic() - start:.2f}s")
+    except Exception as e:
+        # Warm-up is best effort - the first request will simply connect itself
+        print(f"LLM warm-up skipped: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize component parser and LLM on startup (for non-Vercel deployments)"""
     initialize_components()
+    
+    if RATE_LIMIT_ENABLED and WORKERS > 1 and not RATE_LIMIT_DB:
+        print(f"WARNING: rate limits are kept in memory per worker, so each client gets up to "
+              f"{WORKERS}x the configured limit. Set RATE_LIMIT_DB to share them.")
+    
+    if WARMUP_LLM:
+        await warmup_llm_connection()
+    
+    print(f"Worker {os.getpid()} ready")
 
 @app.post("/generate-app", response_model=AppGenerationResponse)
-async def generate_react_app(request: AppGenerationRequest):
+async def generate_react_app(request: AppGenerationRequest, http_request: Request):
     """
     Generate a React app.jsx file based on user requirements using available shadcn components
     """
@@ -564,14 +970,14 @@ async def generate_react_app(request: AppGenerationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to initialize: {str(e)}")
     
+    # Initialize app generator with global component parser
+    app_generator = ReactAppGenerator(llm, component_parser)
+    
     try:
         print(f"Generating app for prompt: {request.user_prompt}")
         
-        # Initialize app generator with global component parser
-        app_generator = ReactAppGenerator(llm, component_parser)
-        
         # Generate the app
-        app_code, used_components = app_generator.generate_app(request.user_prompt)
+        app_code, used_components = await app_generator.generate_app(request.user_prompt)
         
         print(f"Successfully generated app with {len(used_components)} components")
         
@@ -587,6 +993,9 @@ async def generate_react_app(request: AppGenerationRequest):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error generating app: {str(e)}")
+    finally:
+        # Hand the LLM usage to the rate limiter, including when generation failed after the call
+        http_request.state.llm_usage = app_generator.last_usage
 
 @app.get("/components")
 async def get_available_components():
@@ -616,6 +1025,20 @@ async def get_available_components():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/usage")
+async def get_usage(request: Request, show_all: bool = Query(False, alias="all")):
+    """
+    Get request and LLM token consumption for the calling client, or for every client with the admin key
+    """
+    if show_all:
+        admin_key = request.headers.get("x-admin-key", "")
+        if not RATE_LIMIT_ADMIN_KEY or not hmac.compare_digest(admin_key.encode(), RATE_LIMIT_ADMIN_KEY.encode()):
+            raise HTTPException(status_code=403, detail="Admin key required to list all clients")
+        
+        return {"clients": await rate_limiter.run(rate_limiter.get_all_usage)}
+    
+    return await rate_limiter.run(rate_limiter.get_usage, get_client_id(request))
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -634,7 +1057,7 @@ async def health_check():
     return status
 
 @app.get("/test-llm")
-async def test_llm():
+async def test_llm(http_request: Request):
     """Test LLM endpoint"""
     global llm
     
@@ -643,7 +1066,9 @@ async def test_llm():
     
     try:
         from langchain_core.messages import HumanMessage
-        response = llm.invoke([HumanMessage(content="Say 'Hello, LLM is working!'")])
+        response = await llm.ainvoke([HumanMessage(content="Say 'Hello, LLM is working!'")])
+        # Record usage first so the tokens are charged even if building the reply fails
+        http_request.state.llm_usage = response.usage_metadata or {}
         return {"message": response.content, "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM test failed: {str(e)}")
@@ -678,8 +1103,21 @@ if __name__ == "__main__":
     
     print(f"Starting server in {ENVIRONMENT} mode")
     print(f"CORS allowed origins: {allowed_origins}")
-    print(f"Server will run on {host}:{port}")
+    print(f"Server will run on {host}:{port} with {WORKERS} worker(s)")
     
-    # Run the FastAPI server
-    uvicorn.run(app, host=host, port=port)
-    
\ No newline at end of file
+    # Run the FastAPI server. Multiple workers need an import string so each
+    # process can load the app itself; "auto" picks uvloop/httptools when installed.
+    uvicorn.run(
+        "server:app" if WORKERS > 1 else app,
+        host=host,
+        port=port,
+        workers=WORKERS,
+        loop="auto",
+        http="auto",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        log_level=LOG_LEVEL,
+    )